@@ -32,6 +32,7 @@ class BackupContext:
         self._lock_conf = config.get("lock")
         self._ch_ctl_conf = config.get("clickhouse")
         self._main_conf = config.get("main")
+        self._multiprocessing_conf = config.get("multiprocessing")
         self._config = config.get("backup")
         self._zk_config = config.get("zookeeper")
         self._cloud_conf = config.get("cloud_storage")
@@ -87,7 +88,10 @@ class BackupContext:
         """
         if not hasattr(self, "_ch_ctl"):
             self._ch_ctl = ClickhouseCTL(
-                self._ch_ctl_conf, self._main_conf, self._config
+                self._ch_ctl_conf,
+                self._main_conf,
+                self._config,
+                self._multiprocessing_conf,
             )
         return self._ch_ctl
 
@@ -2,13 +2,20 @@
 ClickHouse client.
 """
 
-from typing import Any
+import threading
+from typing import Any, Sequence
 
 import requests
+from requests.adapters import HTTPAdapter
 
 from ch_backup import logging
 from ch_backup.util import retry
 
+try:
+    import orjson
+except ImportError:  # orjson is not available for Python < 3.8
+    orjson = None  # type: ignore[assignment]
+
 
 class ClickhouseError(Exception):
     """
@@ -25,7 +32,14 @@ class ClickhouseClient:
         host = config["host"]
         protocol = config["protocol"]
         port = config["port"] or (8123 if protocol == "http" else 8443)
-        self._session = self._create_session(config, settings)
+        self._config = config
+        self._settings = dict(settings or {})
+        self._local = threading.local()
+        # Connection pool is shared between sessions of all threads, so connections
+        # outlive threads of short-lived thread pools and are reused by the next ones.
+        self._adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=config["pool_size"]
+        )
         self._url = f"{protocol}://{host}:{port}"
         self.timeout = config["timeout"]
         self.connect_timeout = config["connect_timeout"]
@@ -35,7 +49,7 @@ class ClickhouseClient:
         """
         ClickHouse settings.
         """
-        return self._session.params
+        return self._settings
 
     @retry((requests.exceptions.ConnectionError, ClickhouseError))
     def query(
@@ -45,22 +59,36 @@ class ClickhouseClient:
         settings: dict = None,
         timeout: float = None,
         log_entry_length: int = None,
+        parameters: dict = None,
     ) -> Any:
         """
         Execute query.
+
+        Parameters are substituted by ClickHouse into {name:Type} placeholders of the query.
         """
         try:
-            logging.debug(
-                "Executing query: {}",
-                query if not log_entry_length else query[:log_entry_length] + "...",
+            query_text = (
+                query if not log_entry_length else query[:log_entry_length] + "..."
             )
+            if parameters:
+                logging.debug(
+                    "Executing query: {}, parameters: {}", query_text, parameters
+                )
+            else:
+                logging.debug("Executing query: {}", query_text)
 
             if timeout is None:
                 timeout = self.timeout
 
-            response = self._session.post(
+            params = settings
+            if parameters:
+                params = dict(settings or {})
+                for name, value in parameters.items():
+                    params[f"param_{name}"] = _escape_parameter(value)
+
+            response = self._get_session().post(
                 self._url,
-                params=settings,
+                params=params,
                 json=post_data,
                 timeout=(self.connect_timeout, timeout),
                 data=query.encode("utf-8"),
@@ -70,14 +98,26 @@ class ClickhouseClient:
         except requests.exceptions.HTTPError as e:
             raise ClickhouseError(e.response.text.strip()) from e
 
-        try:
-            return response.json()
-        except ValueError:
-            return str.strip(response.text)
+        return _parse_response(response)
+
+    def _get_session(self) -> requests.Session:
+        """
+        Return HTTP session of the current thread.
+
+        requests.Session is not thread-safe, so each thread (e.g. the ones that freeze
+        tables in parallel) gets its own session that is created on first use.
+        """
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._create_session(self._config, self._settings, self._adapter)
+            self._local.session = session
+        return session
 
     @staticmethod
-    def _create_session(config, settings):
+    def _create_session(config, settings, adapter):
         session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
 
         ca_path = config.get("ca_path")
         session.verify = True if ca_path is None else ca_path
@@ -92,9 +132,51 @@ class ClickhouseClient:
 
         session.headers.update(headers)
 
-        if settings:
-            session.params = settings
+        # Settings dict is shared between sessions of all threads.
+        session.params = settings
 
         requests.packages.urllib3.disable_warnings()  # type: ignore[attr-defined]
 
         return session
+
+
+def _escape_parameter(value: Any) -> str:
+    """
+    Escape query parameter value. ClickHouse parses values of parameters in TSV escaped format.
+
+    Lists and tuples are passed as array literals, e.g. for Array(String) parameters. Such values
+    are parsed as literals without TSV unescaping, so only string elements are quoted.
+    """
+    if isinstance(value, (list, tuple)):
+        return _format_array(value)
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+
+def _format_array(values: Sequence[Any]) -> str:
+    """
+    Format array literal with quoted string elements.
+    """
+    items = []
+    for value in values:
+        if isinstance(value, str):
+            value = "'" + value.replace("\\", "\\\\").replace("'", "\\'") + "'"
+        items.append(str(value))
+    return f"[{','.join(items)}]"
+
+
+def _parse_response(response: requests.Response) -> Any:
+    """
+    Parse JSON response or return its text if response is not JSON.
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(response.content)
+        except orjson.JSONDecodeError:
+            # orjson rejects invalid UTF-8 that can come from binary data of String
+            # values, while the standard decoder replaces it.
+            pass
+
+    try:
+        return response.json()
+    except ValueError:
+        return str.strip(response.text)
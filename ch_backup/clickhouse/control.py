@@ -4,13 +4,16 @@ Clickhouse-control classes module
 
 # pylint: disable=too-many-lines
 
+import hashlib
 import os
 import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager, suppress
-from hashlib import md5
+from functools import lru_cache, partial
 from pathlib import Path
 from tarfile import BLOCKSIZE  # type: ignore
-from typing import Any, Dict, Iterable, List, Optional, Sequence, Union
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Union
 
 from pkg_resources import parse_version
 
@@ -25,11 +28,20 @@ from ch_backup.util import (
     chown_dir_contents,
     chown_file,
     escape,
-    list_dir_files,
+    read_by_chunks,
     retry,
+    scan_dir_files,
     strip_query,
 )
 
+# Size of chunks used to calculate checksums of data parts.
+CHECKSUM_READ_CHUNK_SIZE = 1024 * 1024
+# Hash functions available for calculation of data part checksums.
+PART_CHECKSUM_ALGORITHMS: Dict[str, Callable[..., Any]] = {
+    "md5": hashlib.md5,
+    "blake2b": partial(hashlib.blake2b, digest_size=16),
+}
+
 ACCESS_ENTITY_CHAR = {
     "users": "U",
     "roles": "R",
@@ -76,7 +88,7 @@ CHECK_TABLE_SQL = strip_query(
     """
     SELECT count()
     FROM system.tables
-    WHERE database = '{db_name}' AND name = '{table_name}'
+    WHERE database = {db_name:String} AND name = {table_name:String}
     FORMAT TSVRaw
 """
 )
@@ -162,8 +174,8 @@ GET_DATABASES_SQL = strip_query(
         engine,
         metadata_path
     FROM system.databases
-    WHERE name NOT IN ('system', '_temporary_and_external_tables', 'information_schema', 'INFORMATION_SCHEMA', '{system_db}')
-    FORMAT JSON
+    WHERE name NOT IN ('system', '_temporary_and_external_tables', 'information_schema', 'INFORMATION_SCHEMA', {system_db:String})
+    FORMAT JSONCompact
 """
 )
 
@@ -209,7 +221,7 @@ GET_DEDUPLICATED_PARTS_SQL = strip_query(
     JOIN `{system_db}`._deduplication_info_current
     ON _deduplication_info.name = _deduplication_info_current.name
         AND _deduplication_info.checksum = _deduplication_info_current.checksum
-    WHERE database='{database}' AND table='{table}'
+    WHERE database = {{database:String}} AND table = {{table:String}}
     FORMAT JSON
 """
 )
@@ -223,14 +235,14 @@ SHOW_CREATE_DATABASE_SQL = strip_query(
 
 GET_DATABASE_ENGINE = strip_query(
     """
-    SELECT engine FROM system.databases WHERE name='{db_name}'
+    SELECT engine FROM system.databases WHERE name = {db_name:String}
     FORMAT TSVRaw
 """
 )
 
 GET_DATABASE_METADATA_PATH = strip_query(
     """
-    SELECT metadata_path FROM system.databases WHERE name='{db_name}'
+    SELECT metadata_path FROM system.databases WHERE name = {db_name:String}
     FORMAT JSON
 """
 )
@@ -245,7 +257,7 @@ GET_VERSION_SQL = strip_query(
 GET_MACROS_SQL = strip_query(
     """
     SELECT macro, substitution FROM system.macros
-    FORMAT JSON
+    FORMAT JSONCompact
 """
 )
 
@@ -261,7 +273,7 @@ GET_ACCESS_CONTROL_OBJECTS_SQL = strip_query(
 GET_DISK_SQL = strip_query(
     """
     SELECT name, path, type, cache_path FROM system.disks
-    WHERE name = '{disk_name}'
+    WHERE name = {disk_name:String}
     FORMAT JSON
 """
 )
@@ -269,7 +281,7 @@ GET_DISK_SQL = strip_query(
 GET_DISK_SQL_24_3 = strip_query(
     """
     SELECT name, path, type, object_storage_type, metadata_type, cache_path FROM system.disks
-    WHERE name = '{disk_name}'
+    WHERE name = {disk_name:String}
     FORMAT JSON
 """
 )
@@ -301,14 +313,14 @@ GET_DISKS_SQL_24_3 = strip_query(
 GET_UDF_QUERY_SQL = strip_query(
     """
     SELECT name, create_query FROM system.functions WHERE origin == 'SQLUserDefined'
-    FORMAT JSON
+    FORMAT JSONCompact
 """
 )
 
 GET_NAMED_COLLECTIONS_QUERY_SQL = strip_query(
     """
     SELECT name FROM system.named_collections
-    FORMAT JSON
+    FORMAT JSONCompact
 """
 )
 
@@ -350,20 +362,56 @@ class ClickhouseCTL:
     # pylint: disable=too-many-instance-attributes
 
     def __init__(
-        self, ch_ctl_config: dict, main_config: dict, backup_config: dict
+        self,
+        ch_ctl_config: dict,
+        main_config: dict,
+        backup_config: dict,
+        multiprocessing_config: dict,
     ) -> None:
         self._ch_ctl_config = ch_ctl_config
         self._main_config = main_config
         self._backup_config = backup_config
+        self._scan_frozen_parts_threads = multiprocessing_config[
+            "scan_frozen_parts_threads"
+        ]
+        self._system_db = escape(self._backup_config["system_database"])
+        checksum_algorithm = self._backup_config["part_checksum_algorithm"]
+        if checksum_algorithm not in PART_CHECKSUM_ALGORITHMS:
+            raise ClickhouseBackupError(
+                f"Unknown part checksum algorithm: {checksum_algorithm}"
+            )
+        self._part_checksum_algorithm = PART_CHECKSUM_ALGORITHMS[checksum_algorithm]
         self._root_data_path = self._ch_ctl_config["data_path"]
         self._shadow_data_path = os.path.join(self._root_data_path, "shadow")
         self._timeout = self._ch_ctl_config["timeout"]
         self._freeze_timeout = self._ch_ctl_config["freeze_timeout"]
         self._unfreeze_timeout = self._ch_ctl_config["unfreeze_timeout"]
         self._restore_replica_timeout = self._ch_ctl_config["restore_replica_timeout"]
-        self._ch_client = ClickhouseClient(self._ch_ctl_config)
-        self._ch_version = self._ch_client.query(GET_VERSION_SQL)
-        self._disks = self.get_disks()
+        self._client = ClickhouseClient(self._ch_ctl_config)
+        self._client_lock = threading.Lock()
+        self._client_configured = False
+        self._ch_version: Optional[str] = None
+        self._disks: Optional[Dict[str, Disk]] = None
+
+    @property
+    def _ch_client(self) -> ClickhouseClient:
+        """
+        ClickHouse client with compatibility settings applied.
+
+        The settings depend on ClickHouse version, so they are applied before the first query
+        instead of the construction.
+        """
+        if not self._client_configured:
+            with self._client_lock:
+                if not self._client_configured:
+                    self._client.settings.update(self._get_compatibility_settings())
+                    self._client_configured = True
+        return self._client
+
+    def _get_compatibility_settings(self) -> Dict[str, Any]:
+        """
+        Return settings that allow to restore schemas with deprecated and experimental features.
+        """
         settings = {
             "allow_deprecated_database_ordinary": 1,
             "allow_deprecated_syntax_for_merge_tree": 1,
@@ -400,7 +448,7 @@ class ClickhouseCTL:
                     "allow_suspicious_ttl_expressions": 1,
                 }
             )
-        self._ch_client.settings.update(settings)
+        return settings
 
     def chown_detached_table_parts(self, table: Table, context: RestoreContext) -> None:
         """
@@ -479,7 +527,7 @@ class ClickhouseCTL:
                     logging.debug("Removing shadow data: {}", shadow_path)
                     self._remove_shadow_data(shadow_path)
         else:
-            for disk in self._disks.values():
+            for disk in self._get_cached_disks().values():
                 if disk.type == "local":
                     shadow_path = os.path.join(disk.path, "shadow")
                     logging.debug("Removing shadow data: {}", shadow_path)
@@ -502,15 +550,15 @@ class ClickhouseCTL:
             exclude_dbs = []
 
         result: List[Database] = []
-        system_database = self._backup_config["system_database"]
         ch_resp = self._ch_client.query(
-            GET_DATABASES_SQL.format(system_db=system_database)
+            GET_DATABASES_SQL,
+            parameters={"system_db": self._backup_config["system_database"]},
         )
         if "data" in ch_resp:
             result = [
-                Database(row["name"], row["engine"], row["metadata_path"])
-                for row in ch_resp["data"]
-                if row["name"] not in exclude_dbs
+                Database(name, engine, metadata_path)
+                for name, engine, metadata_path in ch_resp["data"]
+                if name not in exclude_dbs
             ]
 
         return result
@@ -526,8 +574,9 @@ class ClickhouseCTL:
         """
         Return database engine.
         """
-        query_sql = GET_DATABASE_ENGINE.format(db_name=escape(db_name))
-        return self._ch_client.query(query_sql)
+        return self._ch_client.query(
+            GET_DATABASE_ENGINE, parameters={"db_name": db_name}
+        )
 
     def get_tables(
         self,
@@ -541,46 +590,34 @@ class ClickhouseCTL:
         A short query does not access the source of table if it was built from an external source.
         Example: CREATE ... AS postgresql() or CREATE ... AS s3().
         """
-        db_condition = f"database = '{escape(db_name)}'" if db_name else "1"
-        tables_condition = (
-            f"has(cast({list(map(escape, tables))}, 'Array(String)'), name)"
-            if tables
-            else "1"
-        )
+        db_condition = "database = {db_name:String}" if db_name else "1"
+        tables_condition = "has({tables:Array(String)}, name)" if tables else "1"
         base_query_sql = GET_TABLES_SHORT_SQL if short_query else GET_TABLES_SQL
         query_sql = base_query_sql.format(
             db_condition=db_condition,
             tables_condition=tables_condition,
         )  # type: ignore
         result: List[Table] = []
-        for row in self._ch_client.query(query_sql)["data"]:
+        parameters: Dict[str, Any] = {}
+        if db_name:
+            parameters["db_name"] = db_name
+        if tables:
+            parameters["tables"] = list(tables)
+        ch_resp = self._ch_client.query(query_sql, parameters=parameters)
+        for row in ch_resp["data"]:
             result.append(self._make_table(row))
 
         return result
 
-    def get_table(
-        self, db_name: str, table_name: str, short_query: bool = False
-    ) -> Optional[Table]:
-        """
-        Get table by name, returns None if no table has found.
-        """
-        tables = self.get_tables(db_name, [table_name], short_query)
-
-        if len(tables) > 1:
-            raise RuntimeError(
-                f"Found several tables, when expected to find single table: database {db_name}, table {table_name}"
-            )
-
-        return tables[0] if len(tables) == 1 else None
-
     def does_table_exist(self, db_name: str, table_name: str) -> bool:
         """
         Return True if the specified table exists.
         """
-        query_sql = CHECK_TABLE_SQL.format(
-            db_name=escape(db_name), table_name=escape(table_name)
+        ch_resp = self._ch_client.query(
+            CHECK_TABLE_SQL,
+            parameters={"db_name": db_name, "table_name": table_name},
         )
-        return bool(int(self._ch_client.query(query_sql)))
+        return bool(int(ch_resp))
 
     def attach_database(self, db: Database) -> None:
         """
@@ -671,7 +708,7 @@ class ClickhouseCTL:
         Get filesystem absolute path to database metadata.
         """
         data = self._ch_client.query(
-            GET_DATABASE_METADATA_PATH.format(db_name=database)
+            GET_DATABASE_METADATA_PATH, parameters={"db_name": database}
         )["data"]
         assert len(data) == 1
         return data[0]["metadata_path"]
@@ -686,8 +723,11 @@ class ClickhouseCTL:
 
     def get_version(self) -> str:
         """
-        Get ClickHouse version.
+        Get ClickHouse version. It's requested from ClickHouse on the first call.
         """
+        if self._ch_version is None:
+            # Compatibility settings depend on the version, so it's requested without them.
+            self._ch_version = self._client.query(GET_VERSION_SQL)
         return self._ch_version
 
     def get_access_control_objects(self) -> Sequence[Dict[str, Any]]:
@@ -722,9 +762,8 @@ class ClickhouseCTL:
         result = self._ch_client.query(GET_ZOOKEEPER_ADMIN_UUID).get("data", [])
         return {item["name"]: item["value"] for item in result}
 
-    @staticmethod
     def scan_frozen_parts(
-        table: Table, disk: Disk, data_path: str, backup_name: str
+        self, table: Table, disk: Disk, data_path: str, backup_name: str
     ) -> Iterable[FrozenPart]:
         """
         Yield frozen parts from specific disk and path.
@@ -736,27 +775,24 @@ class ClickhouseCTL:
             logging.debug("Shadow path {} is empty", path)
             return []
 
-        for dir_entry in os.scandir(path):
-            part = dir_entry.name
-            part_path = dir_entry.path
-            checksum = _get_part_checksum(part_path)
-            rel_paths = list_dir_files(part_path)
-            abs_paths = [Path(part_path) / file for file in rel_paths]
-
-            size = calc_aligned_files_size(abs_paths, alignment=BLOCKSIZE)
-            logging.debug(
-                f"scan_freezed_parts: {table.name} -> {escape(table.name)} \n {part}"
-            )
+        with os.scandir(path) as scan:
+            part_paths = [dir_entry.path for dir_entry in scan]
+        if not part_paths:
+            return []
 
-            yield FrozenPart(
-                table.database,
-                table.name,
-                part,
-                disk.name,
-                part_path,
-                checksum,
-                size,
-                rel_paths,
+        # Checksum and size calculation is dominated by syscalls latency, so parts are
+        # processed concurrently.
+        with ThreadPoolExecutor(
+            max_workers=min(self._scan_frozen_parts_threads, len(part_paths))
+        ) as pool:
+            yield from pool.map(
+                partial(
+                    _scan_frozen_part,
+                    table,
+                    disk.name,
+                    self._part_checksum_algorithm,
+                ),
+                part_paths,
             )
 
     @staticmethod
@@ -822,41 +858,37 @@ class ClickhouseCTL:
         """
         Returns True if ClickHouse version >= comparing_version.
         """
-        return parse_version(self.get_version()) >= parse_version(comparing_version)  # type: ignore
+        return _parse_version(self.get_version()) >= _parse_version(comparing_version)
 
     def get_macros(self) -> Dict:
         """
         Get ClickHouse macros.
         """
         ch_resp = self._ch_client.query(GET_MACROS_SQL)
-        return {row["macro"]: row["substitution"] for row in ch_resp.get("data", [])}
+        return dict(ch_resp.get("data", []))
 
     def get_udf_query(self) -> Dict[str, str]:
         """
         Get udf query from system table.
         """
         resp = self._ch_client.query(GET_UDF_QUERY_SQL)
-        return {row["name"]: row["create_query"] for row in resp.get("data", [])}
+        return dict(resp.get("data", []))
 
     def get_named_collections_query(self) -> List[str]:
         """
         Get named collections query from system table.
         """
         resp = self._ch_client.query(GET_NAMED_COLLECTIONS_QUERY_SQL)
-        return [row["name"] for row in resp.get("data", [])]
+        return [row[0] for row in resp.get("data", [])]
 
     def get_disk(self, disk_name: str) -> Disk:
         """
         Get disk by name.
         """
-        if self.ch_version_ge("24.3"):
-            resp = resp = self._ch_client.query(
-                GET_DISK_SQL_24_3.format(disk_name=disk_name)
-            ).get("data")
-        else:
-            resp = self._ch_client.query(GET_DISK_SQL.format(disk_name=disk_name)).get(
-                "data"
-            )
+        query_sql = GET_DISK_SQL_24_3 if self.ch_version_ge("24.3") else GET_DISK_SQL
+        resp = self._ch_client.query(
+            query_sql, parameters={"disk_name": disk_name}
+        ).get("data")
 
         assert resp, f"disk '{disk_name}' not found"
         resp = resp[0]
@@ -900,12 +932,20 @@ class ClickhouseCTL:
             for row in disks_resp.get("data", [])
         }
 
+    def _get_cached_disks(self) -> Dict[str, Disk]:
+        """
+        Get all configured disks. Disks are requested from ClickHouse on the first call.
+        """
+        if self._disks is None:
+            self._disks = self.get_disks()
+        return self._disks
+
     def _make_table(self, record: dict) -> Table:
         return Table(
             database=record["database"],
             name=record["name"],
             engine=record.get("engine", None),
-            disks=list(self._disks.values()),
+            disks=list(self._get_cached_disks().values()),
             data_paths=(
                 record.get("data_paths", [])
                 if "MergeTree" in record.get("engine", "")
@@ -921,7 +961,10 @@ class ClickhouseCTL:
         Reads S3 disk revision counter.
         """
         file_path = os.path.join(
-            self._disks[disk_name].path, "shadow", backup_name, "revision.txt"
+            self._get_cached_disks()[disk_name].path,
+            "shadow",
+            backup_name,
+            "revision.txt",
         )
         if not os.path.exists(file_path):
             return None
@@ -940,20 +983,16 @@ class ClickhouseCTL:
         Create ClickHouse table for deduplication info
         """
         self._ch_client.query(
-            CREATE_IF_NOT_EXISTS_SYSTEM_DB_SQL.format(
-                system_db=escape(self._backup_config["system_database"])
-            )
+            CREATE_IF_NOT_EXISTS_SYSTEM_DB_SQL.format(system_db=self._system_db)
         )
         self._ch_client.query(
             TRUNCATE_TABLE_IF_EXISTS_SQL.format(
-                db_name=escape(self._backup_config["system_database"]),
+                db_name=self._system_db,
                 table_name="_deduplication_info",
             )
         )
         self._ch_client.query(
-            CREATE_IF_NOT_EXISTS_DEDUP_TABLE_SQL.format(
-                system_db=escape(self._backup_config["system_database"])
-            )
+            CREATE_IF_NOT_EXISTS_DEDUP_TABLE_SQL.format(system_db=self._system_db)
         )
 
     def insert_deduplication_info(self, batch: List[str]) -> None:
@@ -962,7 +1001,7 @@ class ClickhouseCTL:
         """
         self._ch_client.query(
             INSERT_DEDUP_INFO_BATCH_SQL.format(
-                system_db=escape(self._backup_config["system_database"]),
+                system_db=self._system_db,
                 table="_deduplication_info",
                 batch=",".join(batch),
             ),
@@ -977,20 +1016,20 @@ class ClickhouseCTL:
         """
         self._ch_client.query(
             TRUNCATE_TABLE_IF_EXISTS_SQL.format(
-                db_name=escape(self._backup_config["system_database"]),
+                db_name=self._system_db,
                 table_name="_deduplication_info_current",
             )
         )
         self._ch_client.query(
             CREATE_IF_NOT_EXISTS_DEDUP_TABLE_CURRENT_SQL.format(
-                system_db=escape(self._backup_config["system_database"])
+                system_db=self._system_db
             )
         )
 
         batch = [f"('{part.name}','{part.checksum}')" for part in frozen_parts.values()]
         self._ch_client.query(
             INSERT_DEDUP_INFO_BATCH_SQL.format(
-                system_db=escape(self._backup_config["system_database"]),
+                system_db=self._system_db,
                 table="_deduplication_info_current",
                 batch=",".join(batch),
             ),
@@ -998,10 +1037,9 @@ class ClickhouseCTL:
         )
         result_json = self._ch_client.query(
             GET_DEDUPLICATED_PARTS_SQL.format(
-                system_db=escape(self._backup_config["system_database"]),
-                database=escape(database),
-                table=escape(table),
-            )
+                system_db=self._system_db,
+            ),
+            parameters={"database": database, "table": table},
         )
 
         return result_json["data"]
@@ -1026,6 +1064,43 @@ class ClickhouseCTL:
                 flag_path.unlink()
 
 
-def _get_part_checksum(part_path: str) -> str:
+@lru_cache(maxsize=None)
+def _parse_version(version: str) -> Any:
+    """
+    Parse version string. Results are cached as version checks are performed often.
+    """
+    return parse_version(version)
+
+
+def _scan_frozen_part(
+    table: Table, disk_name: str, checksum_algorithm: Callable, part_path: str
+) -> FrozenPart:
+    part = os.path.basename(part_path)
+    checksum = _get_part_checksum(part_path, checksum_algorithm)
+    # scandir provides file types without extra stat() calls
+    rel_paths = list(scan_dir_files(Path(part_path), exclude_hidden=True))
+    abs_paths = [Path(part_path) / file for file in rel_paths]
+
+    size = calc_aligned_files_size(abs_paths, alignment=BLOCKSIZE)
+    logging.debug(f"scan_freezed_parts: {table.name} -> {escape(table.name)} \n {part}")
+
+    return FrozenPart(
+        table.database,
+        table.name,
+        part,
+        disk_name,
+        part_path,
+        checksum,
+        size,
+        rel_paths,
+    )
+
+
+def _get_part_checksum(part_path: str, algorithm: Callable) -> str:
     with open(os.path.join(part_path, "checksums.txt"), "rb") as f:
-        return md5(f.read()).hexdigest()  # nosec
+        if hasattr(hashlib, "file_digest"):  # Python 3.11+
+            return hashlib.file_digest(f, algorithm).hexdigest()
+        digest = algorithm()
+        for chunk in read_by_chunks(f, CHECKSUM_READ_CHUNK_SIZE):
+            digest.update(chunk)
+        return digest.hexdigest()
@@ -30,6 +30,9 @@ DEFAULT_CONFIG = {
         "port": None,
         "ca_path": None,
         "connect_timeout": _as_seconds("10 sec"),
+        # The maximum number of HTTP connections to ClickHouse kept alive for reuse.
+        # Should not be less than multiprocessing.freeze_threads.
+        "pool_size": 10,
         "timeout": _as_seconds("1.5 min"),
         "freeze_timeout": _as_seconds("45 min"),
         "unfreeze_timeout": _as_seconds("1 hour"),
@@ -48,6 +51,9 @@ DEFAULT_CONFIG = {
             "days": 7,
         },
         "deduplication_batch_size": 500,
+        # Hash function used to calculate data part checksums: "md5" or "blake2b".
+        # Parts are deduplicated only with parts having checksum calculated by the same function.
+        "part_checksum_algorithm": "md5",
         "min_interval": {
             "minutes": 0,
         },
@@ -158,6 +164,8 @@ DEFAULT_CONFIG = {
         "cloud_storage_restore_workers": 4,
         # The number of threads for parallel freeze of tables
         "freeze_threads": 4,
+        # The maximum number of threads for parallel scan of frozen parts of a table
+        "scan_frozen_parts_threads": 32,
     },
     "pipeline": {
         # Is asynchronous pipelines used (based on Pypeln library)
@@ -3,13 +3,13 @@ Clickhouse backup logic for tables
 """
 
 import os
-from collections import deque
+from collections import defaultdict, deque
 from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
 from functools import partial
 from itertools import chain
 from pathlib import Path
-from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
 
 from ch_backup import logging
 from ch_backup.backup.deduplication import deduplicate_parts
@@ -27,7 +27,10 @@ from ch_backup.clickhouse.schema import (
 from ch_backup.exceptions import ClickhouseBackupError
 from ch_backup.logic.backup_manager import BackupManager
 from ch_backup.logic.upload_part_observer import UploadPartObserver
-from ch_backup.util import compare_schema, get_table_zookeeper_paths
+from ch_backup.util import chunked, compare_schema, get_table_zookeeper_paths
+
+# The maximum number of table names passed to a single system.tables query.
+GET_TABLES_BATCH_SIZE = 500
 
 
 @dataclass
@@ -114,6 +117,8 @@ class TableBackup(BackupManager):
             # To ensure consistency between metadata and data backups.
             # See https://en.wikipedia.org/wiki/Optimistic_concurrency_control
             mtimes = self._collect_local_metadata_mtime(context, db, tables)
+            # Tables must be fetched after collecting mtimes, so a table recreated in between
+            # is either frozen with its actual data paths or detected by the mtime check.
             tables_ = list(
                 filter(
                     lambda table: table.name in mtimes,
@@ -294,7 +299,7 @@ class TableBackup(BackupManager):
         )
 
         if tables:
-            db_tables = [(table.database, table.name) for table in tables_meta]
+            db_tables = {(table.database, table.name) for table in tables_meta}
 
             logging.debug("Checking for presence of required tables")
 
@@ -315,14 +320,14 @@ class TableBackup(BackupManager):
             logging.debug("All required tables are present")
 
             logging.debug("Leaving only required tables metadata")
-            required_tables = [(table.database, table.name) for table in tables]
+            required_tables = {(table.database, table.name) for table in tables}
             tables_meta = list(
                 filter(lambda t: (t.database, t.name) in required_tables, tables_meta)
             )
 
         if exclude_tables:
             logging.debug("Excluding unnecessary tables metadata")
-            excluded_tables = [(table.database, table.name) for table in exclude_tables]
+            excluded_tables = {(table.database, table.name) for table in exclude_tables}
             tables_meta = list(
                 filter(
                     lambda t: (t.database, t.name) not in excluded_tables, tables_meta
@@ -352,7 +357,7 @@ class TableBackup(BackupManager):
             )
             return
 
-        failed_tables_names = [f"`{t.database}`.`{t.name}`" for t in failed_tables]
+        failed_tables_names = {f"`{t.database}`.`{t.name}`" for t in failed_tables}
         tables_to_restore_data = filter(
             lambda t: f"`{t.database}`.`{t.name}`" not in failed_tables_names,
             tables_meta,
@@ -593,6 +598,9 @@ class TableBackup(BackupManager):
     ) -> List[Table]:
         logging.info("Preparing tables for restoring")
 
+        tables = list(tables)
+        inner_tables = self._get_inner_tables(context, databases, tables)
+
         merge_tree_tables = []
         distributed_tables = []
         view_tables = []
@@ -602,7 +610,11 @@ class TableBackup(BackupManager):
                 "Preparing table {} for restoring", f"{table.database}.{table.name}"
             )
             self._rewrite_table_schema(
-                context, databases[table.database], table, add_uuid_if_required=True
+                context,
+                databases[table.database],
+                table,
+                add_uuid_if_required=True,
+                inner_tables=inner_tables,
             )
 
             if table.is_merge_tree():
@@ -645,26 +657,17 @@ class TableBackup(BackupManager):
     ) -> None:
         # pylint: disable=too-many-branches
         logging.info("Restoring tables data")
-        for table_meta in tables:
+        tables_meta = list(tables)
+        short_tables, full_tables = TableBackup._get_tables_to_restore_data(
+            context, tables_meta
+        )
+        for table_meta in tables_meta:
             cloud_storage_parts = []
             try:
-                maybe_table_short = context.ch_ctl.get_table(
-                    table_meta.database, table_meta.name, short_query=True
+                table = TableBackup._get_table_to_restore_data(
+                    table_meta, short_tables, full_tables
                 )
-                if not maybe_table_short:
-                    raise ClickhouseBackupError(
-                        f"Table not found {table_meta.database}.{table_meta.name}"
-                    )
-
-                # We have to check table engine on short Table version
-                # because some of columns might be inaccessbible, for old ch versions.
-                # Fix https://github.com/ClickHouse/ClickHouse/pull/55540 is pesented since 23.8.
-                if not maybe_table_short.is_merge_tree():
-                    logging.debug(
-                        'Skip table "{}.{}" data restore, because it is not MergeTree family.',
-                        table_meta.database,
-                        table_meta.name,
-                    )
+                if not table:
                     continue
 
                 logging.debug(
@@ -673,9 +676,6 @@ class TableBackup(BackupManager):
                     table_meta.name,
                 )
 
-                table: Table = context.ch_ctl.get_table(
-                    table_meta.database, table_meta.name
-                )  # type: ignore
                 attach_parts = []
                 for part in table_meta.get_parts():
                     if context.restore_context.part_restored(part):
@@ -759,12 +759,103 @@ class TableBackup(BackupManager):
 
         logging.info("Restoring tables data completed")
 
+    @staticmethod
+    def _get_tables_to_restore_data(
+        context: BackupContext, tables: List[TableMetadata]
+    ) -> Tuple[Dict[Tuple[str, str], Table], Dict[Tuple[str, str], Table]]:
+        """
+        Fetch short versions of all restoring tables and full versions of MergeTree ones.
+
+        Tables are fetched with a few queries per database instead of two queries per table.
+        """
+        db_tables: Dict[str, Set[str]] = defaultdict(set)
+        for table_meta in tables:
+            db_tables[table_meta.database].add(table_meta.name)
+
+        short_tables: Dict[Tuple[str, str], Table] = {}
+        full_tables: Dict[Tuple[str, str], Table] = {}
+        for db_name, table_names in db_tables.items():
+            merge_tree_table_names = []
+            for table in context.ch_ctl.get_tables(db_name, short_query=True):
+                if table.name not in table_names:
+                    continue
+                short_tables[(table.database, table.name)] = table
+                if table.is_merge_tree():
+                    merge_tree_table_names.append(table.name)
+
+            for table in _get_tables_batched(context, db_name, merge_tree_table_names):
+                full_tables[(table.database, table.name)] = table
+
+        return short_tables, full_tables
+
+    @staticmethod
+    def _get_table_to_restore_data(
+        table_meta: TableMetadata,
+        short_tables: Dict[Tuple[str, str], Table],
+        full_tables: Dict[Tuple[str, str], Table],
+    ) -> Optional[Table]:
+        """
+        Return table to restore data into or None if the table is not MergeTree family.
+        """
+        maybe_table_short = short_tables.get((table_meta.database, table_meta.name))
+        if not maybe_table_short:
+            raise ClickhouseBackupError(
+                f"Table not found {table_meta.database}.{table_meta.name}"
+            )
+
+        # We have to check table engine on short Table version
+        # because some of columns might be inaccessbible, for old ch versions.
+        # Fix https://github.com/ClickHouse/ClickHouse/pull/55540 is pesented since 23.8.
+        if not maybe_table_short.is_merge_tree():
+            logging.debug(
+                'Skip table "{}.{}" data restore, because it is not MergeTree family.',
+                table_meta.database,
+                table_meta.name,
+            )
+            return None
+
+        table = full_tables.get((table_meta.database, table_meta.name))
+        if not table:
+            raise ClickhouseBackupError(
+                f"Table not found {table_meta.database}.{table_meta.name}"
+            )
+        return table
+
+    @staticmethod
+    def _get_inner_tables(
+        context: BackupContext, databases: Dict[str, Database], tables: List[Table]
+    ) -> Dict[Tuple[str, str], Table]:
+        """
+        Fetch existing inner tables of restoring materialized views.
+
+        Tables are fetched with a few queries per database instead of one query per view.
+        """
+        if not context.ch_ctl.ch_version_ge("21.4"):
+            return {}
+
+        db_inner_tables: Dict[str, List[str]] = defaultdict(list)
+        for table in tables:
+            if (
+                table.uuid
+                and table.is_materialized_view()
+                and databases[table.database].is_atomic()
+            ):
+                db_inner_tables[table.database].append(_inner_table_name(table))
+
+        result: Dict[Tuple[str, str], Table] = {}
+        for db_name, table_names in db_inner_tables.items():
+            for table in _get_tables_batched(context, db_name, table_names):
+                result[(table.database, table.name)] = table
+
+        return result
+
     def _rewrite_table_schema(
         self,
         context: BackupContext,
         db: Database,
         table: Table,
         add_uuid_if_required: bool = False,
+        inner_tables: Optional[Dict[Tuple[str, str], Table]] = None,
     ) -> None:
         add_uuid = False
         inner_uuid = None
@@ -772,8 +863,8 @@ class TableBackup(BackupManager):
             add_uuid = True
             # Starting with 21.4 it's required to explicitly set inner table UUID for materialized views.
             if table.is_materialized_view() and context.ch_ctl.ch_version_ge("21.4"):
-                inner_table = context.ch_ctl.get_table(
-                    table.database, f".inner_id.{table.uuid}"
+                inner_table = (inner_tables or {}).get(
+                    (table.database, _inner_table_name(table))
                 )
                 if inner_table:
                     inner_uuid = inner_table.uuid
@@ -881,3 +972,20 @@ class TableBackup(BackupManager):
             raise ClickhouseBackupError(
                 f"Failed to restore table: {table.database}.{table.name}"
             )
+
+
+def _get_tables_batched(
+    context: BackupContext, db_name: str, table_names: List[str]
+) -> Iterable[Table]:
+    """
+    Fetch tables by names in batches to keep the size of each query bounded.
+    """
+    for batch in chunked(table_names, GET_TABLES_BATCH_SIZE):
+        yield from context.ch_ctl.get_tables(db_name, batch)
+
+
+def _inner_table_name(table: Table) -> str:
+    """
+    Return name of the inner table of the materialized view with UUID.
+    """
+    return f".inner_id.{table.uuid}"
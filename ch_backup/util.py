@@ -97,15 +97,21 @@ def list_dir_files(dir_path: str) -> List[str]:
 
 
 def scan_dir_files(
-    dir_path: Path, exclude_file_names: Optional[List[str]] = None
+    dir_path: Path,
+    exclude_file_names: Optional[List[str]] = None,
+    exclude_hidden: bool = False,
 ) -> Iterable[str]:
     """
-    Yields relative file paths in a given directory and excludes files with given names
+    Yields relative file paths in a given directory and excludes files with given names.
+
+    If exclude_hidden is set, files and directories starting with a dot are skipped like list_dir_files() does.
     """
 
     def scan_recursive(dir_path: Path, relative_prefix: Path = None) -> Iterable[str]:
         with os.scandir(dir_path) as scan:
             for dir_entry in scan:
+                if exclude_hidden and dir_entry.name.startswith("."):
+                    continue
                 if dir_entry.is_file():
                     if (
                         exclude_file_names is None
@@ -3,14 +3,19 @@ Docker Compose interface.
 """
 
 import os
-import shlex
 import subprocess
+import tempfile
 
 import yaml
 
 from . import utils
 from .typing import ContextT
 
+try:
+    from yaml import CSafeDumper as SafeDumper
+except ImportError:  # PyYAML is built without libyaml
+    from yaml import SafeDumper  # type: ignore[assignment]
+
 COMPOSE_UP_DOWN_TIMEOUT = 30
 
 
@@ -19,7 +24,7 @@ def build_images(context: ContextT) -> None:
     """
     Build docker images.
     """
-    _call_compose(context.conf, command="build")
+    _call_compose(context.conf, "build")
 
 
 @utils.env_stage("start", fail=True)
@@ -29,8 +34,11 @@ def startup_containers(context: ContextT) -> None:
     """
     _call_compose(
         context.conf,
+        "up",
+        "-d",
+        "--timeout",
+        str(COMPOSE_UP_DOWN_TIMEOUT),
         project_name=_project_name(context.conf),
-        command=f"up -d --timeout {COMPOSE_UP_DOWN_TIMEOUT}",
     )
 
 
@@ -40,11 +48,14 @@ def shutdown_containers(context: ContextT) -> None:
     Shutdown and remove docker containers.
     """
     project_name = _project_name(context.conf)
-    _call_compose(context.conf, project_name=project_name, command="kill")
+    _call_compose(context.conf, "kill", project_name=project_name)
     _call_compose(
         context.conf,
+        "down",
+        "--volumes",
+        "--timeout",
+        str(COMPOSE_UP_DOWN_TIMEOUT),
         project_name=project_name,
-        command=f"down --volumes --timeout {COMPOSE_UP_DOWN_TIMEOUT}",
     )
 
 
@@ -161,9 +172,33 @@ def _write_compose_config(context: ContextT, compose_config: dict) -> None:
     """
     config_path = _config_path(context.conf)
 
-    os.makedirs(os.path.dirname(config_path), exist_ok=True)
-    with open(config_path, "w", encoding="utf-8") as file:
-        yaml.dump(compose_config, stream=file, default_flow_style=False, indent=4)
+    config_dir = os.path.dirname(config_path)
+    os.makedirs(config_dir, exist_ok=True)
+    # Write to a temporary file first and then atomically replace the config,
+    # so concurrent readers never see a partially written file.
+    file = tempfile.NamedTemporaryFile(  # pylint: disable=consider-using-with
+        "w",
+        encoding="utf-8",
+        dir=config_dir,
+        prefix=".docker-compose-",
+        suffix=".yml",
+        delete=False,
+    )
+    try:
+        with file:
+            yaml.dump(
+                compose_config,
+                stream=file,
+                Dumper=SafeDumper,
+                default_flow_style=False,
+                indent=4,
+            )
+        # NamedTemporaryFile is created with 0600 mode, make the config readable as before.
+        os.chmod(file.name, 0o644)
+        os.replace(file.name, config_path)
+    except BaseException:
+        os.unlink(file.name)
+        raise
 
     try:
         _validate_config(context)
@@ -175,20 +210,20 @@ def _validate_config(context: ContextT) -> None:
     """
     Perform config validation by calling `docker-compose config`
     """
-    _call_compose(context.conf, command="config")
+    _call_compose(context.conf, "config")
 
 
-def _call_compose(conf: dict, *, command: str, project_name: str = None) -> None:
+def _call_compose(conf: dict, *command: str, project_name: str = None) -> None:
     """
     Execute docker-compose action by invoking `docker-compose`.
     """
-    shell_command = f"docker-compose --file {_config_path(conf)}"
+    args = ["docker-compose", "--file", _config_path(conf)]
     if project_name:
-        shell_command += f" -p {project_name}"
-    shell_command += f" {command}"
+        args += ["-p", project_name]
+    args += command
 
     # Note: build paths are resolved relative to config file location.
-    subprocess.check_call(shlex.split(shell_command))
+    subprocess.check_call(args)
 
 
 def _config_path(config: dict) -> str:
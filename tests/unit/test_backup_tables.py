@@ -1,12 +1,14 @@
 from typing import List
-from unittest.mock import Mock, patch
+from unittest.mock import Mock, call, patch
 
 import pytest
 
+from ch_backup.backup.metadata import TableMetadata
 from ch_backup.backup.metadata.backup_metadata import BackupMetadata
 from ch_backup.backup_context import BackupContext
 from ch_backup.clickhouse.models import Database, Table
 from ch_backup.config import DEFAULT_CONFIG
+from ch_backup.exceptions import ClickhouseBackupError
 from ch_backup.logic.table import TableBackup
 
 UUID = "fa8ff291-1922-4b7f-afa7-06633d5e16ae"
@@ -79,3 +81,157 @@ def test_backup_table_skipping_if_metadata_updated_during_backup(
     assert len(context.backup_meta.get_tables(db_name)) == backups_expected
     # One call after each table and one after database is backuped
     assert clickhouse_ctl_mock.remove_freezed_data.call_count == 2
+
+
+def test_backup_fetches_tables_after_collecting_metadata_mtime() -> None:
+    db_name = "db1"
+    calls = []
+
+    def get_tables(*_args, **_kwargs):
+        calls.append("get_tables")
+        return [
+            Table(
+                db_name,
+                "table1",
+                "MergeTree",
+                [],
+                [],
+                "/var/lib/clickhouse/metadata/db1/table1.sql",
+                "",
+                UUID,
+            )
+        ]
+
+    def getmtime(_path):
+        calls.append("getmtime")
+        return 1689000195.8
+
+    context = BackupContext(DEFAULT_CONFIG)  # type: ignore[arg-type]
+    context.ch_ctl = Mock()
+    context.ch_ctl.get_tables.side_effect = get_tables
+    context.backup_layout = Mock()
+    context.backup_meta = Mock()
+    db = Database(db_name, "Atomic", "/var/lib/clickhouse/metadata/db1.sql")
+
+    with patch("os.path.getmtime", side_effect=getmtime), patch.object(
+        TableBackup, "_freeze_tables", return_value=[]
+    ) as freeze_tables_mock:
+        TableBackup()._backup(  # pylint: disable=protected-access
+            context, db, ["table1"], "backup1", False, 1
+        )
+
+    # Tables to freeze are fetched after metadata mtime is collected.
+    assert calls == ["get_tables", "getmtime", "get_tables"]
+    assert [table.name for table in freeze_tables_mock.call_args[0][2]] == ["table1"]
+
+
+def _make_table(db_name: str, table_name: str, engine: str, uuid: str = "") -> Table:
+    return Table(db_name, table_name, engine, [], [], "", "", uuid)
+
+
+def test_get_tables_to_restore_data() -> None:
+    # pylint: disable=protected-access
+    db_name = "db1"
+    short_tables = [
+        _make_table(db_name, "merge_tree", "MergeTree"),
+        _make_table(db_name, "log", "TinyLog"),
+        _make_table(db_name, "not_restoring", "MergeTree"),
+    ]
+
+    def get_tables(db_name, tables=None, short_query=False):
+        if short_query:
+            return short_tables
+        return [_make_table(db_name, name, "MergeTree", UUID) for name in tables]
+
+    context = BackupContext(DEFAULT_CONFIG)  # type: ignore[arg-type]
+    context.ch_ctl = Mock()
+    context.ch_ctl.get_tables.side_effect = get_tables
+
+    tables_meta = {
+        name: TableMetadata(db_name, name, engine, None)
+        for name, engine in [
+            ("merge_tree", "MergeTree"),
+            ("log", "TinyLog"),
+            ("missing", "MergeTree"),
+        ]
+    }
+    short, full = TableBackup._get_tables_to_restore_data(
+        context, list(tables_meta.values())
+    )
+
+    # Short query is not limited by table names, full one is requested only for MergeTree tables
+    assert context.ch_ctl.get_tables.call_args_list == [
+        call(db_name, short_query=True),
+        call(db_name, ["merge_tree"]),
+    ]
+    assert set(short) == {(db_name, "merge_tree"), (db_name, "log")}
+    assert set(full) == {(db_name, "merge_tree")}
+
+    table = TableBackup._get_table_to_restore_data(
+        tables_meta["merge_tree"], short, full
+    )
+    assert table is full[(db_name, "merge_tree")]
+    assert table.uuid == UUID
+
+    assert (
+        TableBackup._get_table_to_restore_data(tables_meta["log"], short, full) is None
+    )
+
+    with pytest.raises(ClickhouseBackupError):
+        TableBackup._get_table_to_restore_data(tables_meta["missing"], short, full)
+
+
+def test_get_tables_to_restore_data_batched() -> None:
+    # pylint: disable=protected-access
+    db_name = "db1"
+    table_names = [f"table{i}" for i in range(5)]
+
+    def get_tables(db_name, tables=None, short_query=False):
+        if short_query:
+            return [_make_table(db_name, name, "MergeTree") for name in table_names]
+        return [_make_table(db_name, name, "MergeTree") for name in tables]
+
+    context = BackupContext(DEFAULT_CONFIG)  # type: ignore[arg-type]
+    context.ch_ctl = Mock()
+    context.ch_ctl.get_tables.side_effect = get_tables
+
+    with patch("ch_backup.logic.table.GET_TABLES_BATCH_SIZE", 2):
+        _, full = TableBackup._get_tables_to_restore_data(
+            context,
+            [TableMetadata(db_name, name, "MergeTree", None) for name in table_names],
+        )
+
+    assert context.ch_ctl.get_tables.call_args_list[1:] == [
+        call(db_name, ["table0", "table1"]),
+        call(db_name, ["table2", "table3"]),
+        call(db_name, ["table4"]),
+    ]
+    assert set(full) == {(db_name, name) for name in table_names}
+
+
+def test_get_inner_tables() -> None:
+    db_name = "db1"
+    inner_uuid = "b6fc1e2d-7f3f-4ed2-8f4a-3e0ab45cbc1e"
+    view = _make_table(db_name, "view", "MaterializedView", UUID)
+    view_without_inner = _make_table(
+        db_name, "view2", "MaterializedView", "00000000-0000-0000-0000-000000000001"
+    )
+    inner_table = _make_table(db_name, f".inner_id.{UUID}", "MergeTree", inner_uuid)
+
+    context = BackupContext(DEFAULT_CONFIG)  # type: ignore[arg-type]
+    context.ch_ctl = Mock()
+    context.ch_ctl.ch_version_ge.return_value = True
+    context.ch_ctl.get_tables.return_value = [inner_table]
+
+    databases = {db_name: Database(db_name, "Atomic", None)}
+    result = TableBackup._get_inner_tables(  # pylint: disable=protected-access
+        context,
+        databases,
+        [view, view_without_inner, _make_table(db_name, "table", "MergeTree", UUID)],
+    )
+
+    context.ch_ctl.get_tables.assert_called_once_with(
+        db_name,
+        [f".inner_id.{UUID}", ".inner_id.00000000-0000-0000-0000-000000000001"],
+    )
+    assert result == {(db_name, f".inner_id.{UUID}"): inner_table}
@@ -0,0 +1,90 @@
+"""
+Unit tests for ClickHouse client.
+"""
+
+from unittest.mock import Mock, patch
+
+import pytest
+import requests
+
+from ch_backup.clickhouse.client import (
+    ClickhouseClient,
+    _escape_parameter,
+    _parse_response,
+)
+from ch_backup.config import DEFAULT_CONFIG
+
+
+def _response(content: bytes) -> requests.Response:
+    response = requests.Response()
+    response.status_code = 200
+    response.encoding = "utf-8"
+    response._content = content  # pylint: disable=protected-access
+    return response
+
+
+@pytest.mark.parametrize(
+    "content,expected",
+    [
+        pytest.param(b'{"data": [["db1"]]}', {"data": [["db1"]]}, id="json"),
+        pytest.param(b'{"data": [["\xff"]]}', {"data": [["�"]]}, id="invalid utf-8"),
+        pytest.param(b"Ok.\n", "Ok.", id="text"),
+        pytest.param(b"", "", id="empty"),
+    ],
+)
+def test_parse_response(content: bytes, expected: object) -> None:
+    assert _parse_response(_response(content)) == expected
+
+
+@pytest.mark.parametrize(
+    "value,expected",
+    [
+        pytest.param("db1", "db1", id="string"),
+        pytest.param(42, "42", id="int"),
+        pytest.param("a\tb\nc\\d", "a\\tb\\nc\\\\d", id="tsv special characters"),
+        pytest.param("it's", "it's", id="quote"),
+        pytest.param(["a", "b"], "['a','b']", id="array"),
+        pytest.param([], "[]", id="empty array"),
+        pytest.param(("a",), "['a']", id="tuple"),
+        pytest.param([1, 2], "[1,2]", id="array of ints"),
+        pytest.param(["it's", "a\\b"], "['it\\'s','a\\\\b']", id="array quoting"),
+        pytest.param(["a\tb\nc"], "['a\tb\nc']", id="array control characters"),
+    ],
+)
+def test_escape_parameter(value: object, expected: str) -> None:
+    assert _escape_parameter(value) == expected
+
+
+@pytest.mark.parametrize(
+    "settings,parameters,expected",
+    [
+        pytest.param(None, None, None, id="no parameters"),
+        pytest.param({"a": 1}, None, {"a": 1}, id="settings only"),
+        pytest.param(
+            None,
+            {"db_name": "db\t1"},
+            {"param_db_name": "db\\t1"},
+            id="parameters only",
+        ),
+        pytest.param(
+            {"a": 1},
+            {"db_name": "db1", "tables": ["t1"]},
+            {"a": 1, "param_db_name": "db1", "param_tables": "['t1']"},
+            id="settings and parameters",
+        ),
+    ],
+)
+def test_query_parameters(settings: dict, parameters: dict, expected: dict) -> None:
+    session = Mock()
+    session.post.return_value = _response(b"Ok.")
+    client = ClickhouseClient(DEFAULT_CONFIG["clickhouse"])  # type: ignore[arg-type]
+
+    with patch.object(client, "_get_session", return_value=session):
+        assert (
+            client.query("SELECT 1", settings=settings, parameters=parameters) == "Ok."
+        )
+
+    assert session.post.call_args[1]["params"] == expected
+    # Settings passed by caller are not modified.
+    if settings is not None:
+        assert "param_db_name" not in settings
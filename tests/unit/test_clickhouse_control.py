@@ -0,0 +1,191 @@
+"""
+Unit tests for ClickHouse control module.
+"""
+
+import os
+from hashlib import blake2b, md5
+from pathlib import Path
+from tarfile import BLOCKSIZE  # type: ignore
+from types import SimpleNamespace
+from typing import Any, List
+from unittest.mock import patch
+
+import pytest
+
+from ch_backup.calculators import calc_aligned_files_size
+from ch_backup.clickhouse.control import (
+    CHECKSUM_READ_CHUNK_SIZE,
+    GET_DATABASES_SQL,
+    GET_VERSION_SQL,
+    PART_CHECKSUM_ALGORITHMS,
+    ClickhouseCTL,
+    _get_part_checksum,
+)
+from ch_backup.clickhouse.models import Disk, FrozenPart, Table
+from ch_backup.config import DEFAULT_CONFIG
+from ch_backup.exceptions import ClickhouseBackupError
+from ch_backup.util import list_dir_files
+
+
+def _make_ch_ctl(**backup_config: Any) -> ClickhouseCTL:
+    with patch.object(ClickhouseCTL, "ch_version_ge", return_value=True):
+        return ClickhouseCTL(
+            DEFAULT_CONFIG["clickhouse"],  # type: ignore[arg-type]
+            DEFAULT_CONFIG["main"],  # type: ignore[arg-type]
+            {**DEFAULT_CONFIG["backup"], **backup_config},  # type: ignore[dict-item]
+            DEFAULT_CONFIG["multiprocessing"],  # type: ignore[arg-type]
+        )
+
+
+def _create_part(part_path: Path, files: dict) -> None:
+    for name, content in files.items():
+        file_path = part_path / name
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_bytes(content)
+
+
+def _scan_frozen_parts_serially(
+    table: Table, disk: Disk, shadow_path: str
+) -> List[FrozenPart]:
+    """
+    Scan frozen parts the way it was done before parts were scanned concurrently.
+    """
+    result = []
+    for dir_entry in os.scandir(shadow_path):
+        part_path = dir_entry.path
+        with open(os.path.join(part_path, "checksums.txt"), "rb") as f:
+            checksum = md5(f.read()).hexdigest()  # nosec
+        rel_paths = list_dir_files(part_path)
+        abs_paths = [Path(part_path) / file for file in rel_paths]
+        size = calc_aligned_files_size(abs_paths, alignment=BLOCKSIZE)
+        result.append(
+            FrozenPart(
+                table.database,
+                table.name,
+                dir_entry.name,
+                disk.name,
+                part_path,
+                checksum,
+                size,
+                rel_paths,
+            )
+        )
+    return result
+
+
+@pytest.mark.parametrize("scan_threads", [1, 4, 32])
+def test_scan_frozen_parts(tmp_path: Path, scan_threads: int) -> None:
+    data_path = tmp_path / "store" / "abc" / "abcdef"
+    shadow_path = tmp_path / "shadow" / "backup1" / "store" / "abc" / "abcdef"
+    for i in range(10):
+        _create_part(
+            shadow_path / f"all_{i}_{i}_0",
+            {
+                "checksums.txt": f"checksums {i}".encode(),
+                "columns.txt": b"columns",
+                "data.bin": os.urandom(i * 1000),
+                "projection.proj/checksums.txt": b"projection",
+                # Hidden files are not part of frozen parts.
+                ".hidden": b"hidden",
+                ".hidden_dir/data.bin": b"hidden",
+            },
+        )
+    table = Table("db1", "table1", "MergeTree", [], [], "", "", "abcdef")
+    disk = Disk("default", str(tmp_path), "local")
+
+    ch_ctl = _make_ch_ctl()
+    ch_ctl._scan_frozen_parts_threads = scan_threads  # pylint: disable=protected-access
+    parts = list(ch_ctl.scan_frozen_parts(table, disk, str(data_path), "backup1"))
+
+    expected = _scan_frozen_parts_serially(table, disk, str(shadow_path))
+    assert len(parts) == 10
+    assert parts == expected
+
+
+def test_scan_frozen_parts_missing_shadow(tmp_path: Path) -> None:
+    table = Table("db1", "table1", "MergeTree", [], [], "", "", "abcdef")
+    disk = Disk("default", str(tmp_path), "local")
+
+    ch_ctl = _make_ch_ctl()
+    assert not list(
+        ch_ctl.scan_frozen_parts(
+            table, disk, str(tmp_path / "store" / "abc" / "abcdef"), "backup1"
+        )
+    )
+
+
+@pytest.mark.parametrize(
+    "algorithm,expected",
+    [
+        pytest.param("md5", md5(b"checksums").hexdigest(), id="md5"),
+        pytest.param(
+            "blake2b", blake2b(b"checksums", digest_size=16).hexdigest(), id="blake2b"
+        ),
+    ],
+)
+def test_part_checksum_algorithm(tmp_path: Path, algorithm: str, expected: str) -> None:
+    _create_part(tmp_path, {"checksums.txt": b"checksums"})
+    ch_ctl = _make_ch_ctl(part_checksum_algorithm=algorithm)
+
+    checksum = _get_part_checksum(
+        str(tmp_path),
+        ch_ctl._part_checksum_algorithm,  # pylint: disable=protected-access
+    )
+
+    assert checksum == expected
+    assert len(checksum) == 32
+
+
+def test_unknown_part_checksum_algorithm() -> None:
+    with pytest.raises(ClickhouseBackupError):
+        _make_ch_ctl(part_checksum_algorithm="sha1")
+
+
+@pytest.mark.parametrize("algorithm", list(PART_CHECKSUM_ALGORITHMS))
+@pytest.mark.parametrize("size", [0, 100, CHECKSUM_READ_CHUNK_SIZE * 2 + 1])
+def test_part_checksum_without_file_digest(
+    tmp_path: Path, algorithm: str, size: int
+) -> None:
+    _create_part(tmp_path, {"checksums.txt": os.urandom(size)})
+    checksum_algorithm = PART_CHECKSUM_ALGORITHMS[algorithm]
+
+    checksum = _get_part_checksum(str(tmp_path), checksum_algorithm)
+    with patch("ch_backup.clickhouse.control.hashlib", SimpleNamespace()):
+        fallback_checksum = _get_part_checksum(str(tmp_path), checksum_algorithm)
+
+    assert fallback_checksum == checksum
+    assert (
+        checksum
+        == checksum_algorithm((tmp_path / "checksums.txt").read_bytes()).hexdigest()
+    )
+
+
+def test_compatibility_settings_are_applied_lazily() -> None:
+    def query(query_sql: str, **_kwargs: Any) -> Any:
+        if query_sql == GET_VERSION_SQL:
+            return "23.12.1.1"
+        return {"data": []}
+
+    with patch("ch_backup.clickhouse.control.ClickhouseClient") as client_class_mock:
+        client_mock = client_class_mock.return_value
+        client_mock.settings = {}
+        client_mock.query.side_effect = query
+        ch_ctl = ClickhouseCTL(
+            DEFAULT_CONFIG["clickhouse"],  # type: ignore[arg-type]
+            DEFAULT_CONFIG["main"],  # type: ignore[arg-type]
+            DEFAULT_CONFIG["backup"],  # type: ignore[arg-type]
+            DEFAULT_CONFIG["multiprocessing"],  # type: ignore[arg-type]
+        )
+
+        # No queries are sent on construction.
+        assert not client_mock.query.called
+        assert client_mock.settings == {}
+
+        ch_ctl.get_databases()
+
+    assert [c[0][0] for c in client_mock.query.call_args_list] == [
+        GET_VERSION_SQL,
+        GET_DATABASES_SQL,
+    ]
+    assert client_mock.settings["allow_deprecated_database_ordinary"] == 1
+    assert client_mock.settings["allow_suspicious_ttl_expressions"] == 1
@@ -271,6 +271,23 @@ class TestScanDir:
 
         assert actual == expected
 
+    def test_scan_hidden_files(self, tmp_path: Path) -> None:
+        for file_path in ["a", "sub/b", ".hidden", "sub/.hidden", ".hidden_dir/c"]:
+            (tmp_path / file_path).parent.mkdir(parents=True, exist_ok=True)
+            (tmp_path / file_path).write_text("data")
+
+        assert sorted(scan_dir_files(tmp_path)) == [
+            ".hidden",
+            ".hidden_dir/c",
+            "a",
+            "sub/.hidden",
+            "sub/b",
+        ]
+        assert list(scan_dir_files(tmp_path, exclude_hidden=True)) == list_dir_files(
+            str(tmp_path)
+        )
+        assert sorted(list_dir_files(str(tmp_path))) == ["a", "sub/b"]
+
 
 def test_replace_macros():
     assert replace_macros("{a}/{b}", {"a": "1", "b": "2"}) == "1/2"